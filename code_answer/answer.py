@@ -3,12 +3,12 @@
 How does it work:
 1. Giving a query and num_answer, search possible links on site
     stackoverflow.com from Google.
-2. Find all links starts with https://stackoverflow.com/questions/{id}/
+2. Find the unique links starts with https://stackoverflow.com/questions/{id}/
     as question links.
 3. Get the first num_answer entries of the question links,
     as the working question links.
 3. For each working quesiton link, retrieve the page content, get top rated answer,
-then extract the code block or text.
+then extract the code block or text. The links are fetched concurrently.
 
 Available high level functions:
 - answer: Search num_answer of the code answers for a query string.
@@ -18,15 +18,19 @@ Available low level functions:
 - get_answer: Get the top rated stackoverflows codeblock from the question link.
 """
 import argparse
+import functools
 import logging
 import re
 from collections import namedtuple
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from typing import Dict, Generator, Iterable, Iterator, List, Optional
 from urllib import parse as urlparse
 
 import requests
-from lxml import html
+from lxml import etree, html
 from lxml.etree import Element as EtreeElement
+from requests.adapters import HTTPAdapter
 from requests.exceptions import ConnectionError as RequestsConnectionError
 from requests.exceptions import HTTPError as RequestsHTTPError
 from requests.exceptions import RequestException
@@ -38,10 +42,50 @@ NO_RESULTS_MESSAGE = "Sorry, couldn't find any answers with that query"
 TECHNICAL_DIFFICULTY_MESSAGE = "Sorry, there is some technical difficulty"
 CONNECTION_ERROR_MESSAGE = "Sorry, cannot connect to "
 
+REQUEST_TIMEOUT = 10
+PARSE_CHUNK_SIZE = 16384
+MAX_WORKERS = 8
+USER_AGENT = "Mozilla/5.0 (compatible; codeanswer/0.0.1)"
+QUESTION_LINKS_LIMIT = 20
+
+# longer than any partial question link left at the end of a chunk
+_QUESTION_LINK_OVERLAP = 256
+_QUESTION_LINK_RE = re.compile(r"https://stackoverflow\.com/questions/\d+/[a-z0-9-]+")
+
+# compiled once, evaluated against the answercell element in lxml's C core.
+# Kept as two expressions tried in order: a single union with not() guards
+# re-evaluates the <pre><code> search in every branch and is slower.
+_XPATH_PRE_CODE = etree.XPath("descendant::pre[1]/descendant::code[1]")
+_XPATH_POST_BODY = etree.XPath(
+    "descendant::*[contains(concat(' ', normalize-space(@class), ' '),"
+    " ' js-post-body ')][1]"
+)
+
+# stateless, shared by the parsers of all worker threads
+_HTML_ELEMENT_LOOKUP = html.HtmlElementClassLookup()
+
 
 Answer = namedtuple("Answer", ("link", "result"))
 
 
+def _create_session() -> requests.Session:
+    """Return a session shared by all requests of this module. Only a fully
+    read response returns its connection to the pool, see _get_url_stream"""
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    session.headers.update(
+        {
+            "User-Agent": USER_AGENT,
+            "Accept": "text/html",
+            "Accept-Language": "en-US,en;q=0.9",
+        }
+    )
+    return session
+
+
+_SESSION = _create_session()
+
+
 class CodeAnswerError(Exception):
     """Base-class for all exceptions raised by this module.
     There was an ambiguous exception that occurred while handling your
@@ -74,9 +118,14 @@ def answer(query: str, num_answer: int = 1) -> List[Answer]:
     links = get_question_links(query)
     links_request = links[:num_answer]
     results: List[Answer] = []
-    for _, link in enumerate(links_request):
-        if result := get_answer(link):
-            results.append(Answer(link, result))
+    if not links_request:
+        return results
+    # the answer pages are io bound, fetch them concurrently. map keeps the
+    # order of the links and re-raises the first error in that order.
+    with ThreadPoolExecutor(max_workers=min(len(links_request), MAX_WORKERS)) as ex:
+        for link, result in zip(links_request, ex.map(get_answer, links_request)):
+            if result:
+                results.append(Answer(link, result))
     return results
 
 
@@ -88,7 +137,9 @@ def get_answer(url: str) -> Optional[str]:
     url = _get_stackoverflow_scoredesc_url(url)
     try:
         logger.info("Answer URL: %s", url)
-        text = _get_url_content(url)
+        # parse while the page is still being received
+        with closing(_get_url_stream(url)) as chunks:
+            return _extract_answer_from_chunks(chunks)
     except RequestsHTTPError:
         logger.info("RequestsHTTPError: %s", url)
         return None
@@ -96,13 +147,17 @@ def get_answer(url: str) -> Optional[str]:
         raise ConnectionError(url) from e
     except RequestException as e:
         raise GetAnswerError(url) from e
-    return _extract_answer(text)
 
 
+@functools.lru_cache(maxsize=256)
 def _get_stackoverflow_scoredesc_url(url: str) -> str:
     """Add query answertab=scoredesc to the url, to make sure the
     answer from stackoverflow url is sorted by score desc"""
     _append = "answertab=scoredesc"
+    if "#" not in url and "answertab=" not in url:
+        sep = "&" if "?" in url else "?"
+        return f"{url}{sep}{_append}"
+    # fallback: let urlparse place the query before the fragment
     parsed = urlparse.urlparse(url)
     queries = f"{parsed.query}&{_append}" if parsed.query else _append
     replaced: List[str] = []
@@ -115,38 +170,68 @@ def _get_stackoverflow_scoredesc_url(url: str) -> str:
     return urlparse.urlunparse(replaced)
 
 
-def _extract_answer(htmldoc: str) -> Optional[str]:
-    """Extract codeblock from the answer page content"""
+def _extract_answer_from_chunks(chunks: Iterable[str]) -> Optional[str]:
+    """Parse the answer page content chunk by chunk, stop as soon as the
+    first answercell is complete, then extract codeblock from it"""
+    # no id lookup is needed, and comments/PIs never reach text_content
+    parser = etree.HTMLPullParser(
+        events=("end",), collect_ids=False, remove_comments=True, remove_pis=True
+    )
+    parser.set_element_class_lookup(_HTML_ELEMENT_LOOKUP)
+    for chunk in chunks:
+        parser.feed(chunk)
+        if (top_answer := _find_answercell(parser.read_events())) is not None:
+            return _extract_answer_content(top_answer)
     try:
-        top_answer = html.document_fromstring(htmldoc).find_class("answercell")[0]
-    except (KeyError, IndexError):
-        logger.info("No answercell found!")
+        parser.close()
+    except etree.XMLSyntaxError:
+        logger.info("Empty answer page!")
         return None
-    else:
+    if (top_answer := _find_answercell(parser.read_events())) is not None:
         return _extract_answer_content(top_answer)
+    logger.info("No answercell found!")
+    return None
+
+
+def _find_answercell(events: Iterator) -> Optional[EtreeElement]:
+    """Return the first closed element with class answercell from the
+    parser events"""
+    for _, element in events:
+        if "answercell" in element.get("class", "").split():
+            return element
+    return None
 
 
 def _extract_answer_content(top_answer: EtreeElement) -> str:
     """Extract code or codetext from the element. The order is:
     1. if <pre><code> exist, return code.
-    2. if <pre> doesn't exist, return js-post-body text.
+    2. if <pre><code> doesn't exist, return js-post-body text.
     3. otherwise, return all text content of the element
     """
-    if (pre := top_answer.find(".//pre")) is not None:
-        code = pre.find(".//code")
-    elif len(postbody := top_answer.find_class("js-post-body")) > 0:
-        code = postbody[0]
+    if found := _XPATH_PRE_CODE(top_answer):
+        code = found[0]
+    elif found := _XPATH_POST_BODY(top_answer):
+        code = found[0]
     else:
         code = top_answer
     return code.text_content()
 
 
-def _get_url_content(url: str) -> str:
-    """Return page content of the url in text.
+def _get_url_stream(url: str) -> Generator[str, None, None]:
+    """Yield page content of the url in text chunks as they are received.
+    Closing before the last chunk drops the connection instead of pooling it.
     Raises: HTTPError"""
-    resp = requests.get(url)
-    resp.raise_for_status()
-    return resp.text
+    logger.debug("get_url_stream from %s", url)
+    with _SESSION.get(url, timeout=REQUEST_TIMEOUT, stream=True) as resp:
+        resp.raise_for_status()
+        if resp.encoding is None:
+            resp.encoding = "utf-8"
+        yield from resp.iter_content(chunk_size=PARSE_CHUNK_SIZE, decode_unicode=True)
+
+
+def close() -> None:
+    """Close the pooled connections of the module session"""
+    _SESSION.close()
 
 
 def get_question_links(query: str) -> List[str]:
@@ -157,7 +242,8 @@ def get_question_links(query: str) -> List[str]:
     url = urlencode_search_url(query)
     try:
         logger.info("Search engine URL: %s for %s", url, query)
-        text = _get_url_content(url)
+        with closing(_get_url_stream(url)) as chunks:
+            links = _extract_question_links(chunks)
     except RequestsHTTPError:
         return []
     except RequestsConnectionError as e:
@@ -165,7 +251,6 @@ def get_question_links(query: str) -> List[str]:
     except RequestException as e:
         raise GetQuestionLinksError(url, query) from e
     else:
-        links = _extract_question_links(text)
         logger.info("Question links from %s: %s", url, links)
         return links
 
@@ -173,15 +258,40 @@ def get_question_links(query: str) -> List[str]:
 def urlencode_search_url(query: str) -> str:
     """Return the encoded query based on the google,
     hardcoded the site:stackoverflow.com"""
-    queries = urlparse.urlencode({"q": f"site:stackoverflow.com {query}", "hl": "en"})
-    return f"https://www.google.com/search?{queries}"
+    return (
+        "https://www.google.com/search?q=site%3Astackoverflow.com+"
+        f"{urlparse.quote_plus(query)}&hl=en"
+    )
 
 
-def _extract_question_links(text: str) -> List[str]:
-    """Giving the search result text from the search engine,
-    return the links containing https://stackoverflow.com/questions/"""
-    pat = re.compile(r"https://stackoverflow.com/questions/\d+/[a-z0-9-]+")
-    return pat.findall(text)
+def _extract_question_links(chunks: Iterable[str]) -> List[str]:
+    """Giving the search result text chunks from the search engine,
+    return the unique links containing https://stackoverflow.com/questions/
+    in the order found. Stop reading once QUESTION_LINKS_LIMIT are found."""
+    links: Dict[str, None] = {}
+    for link in _iter_question_links(chunks):
+        links[link] = None
+        if len(links) >= QUESTION_LINKS_LIMIT:
+            break
+    return list(links)
+
+
+def _iter_question_links(chunks: Iterable[str]) -> Iterator[str]:
+    """Yield the question links matched in the text chunks. Only the tail of
+    the text is kept between chunks, a match touching the end of the text
+    may still grow, so it is yielded once the next chunk arrives."""
+    buf = ""
+    for chunk in chunks:
+        buf += chunk
+        keep = max(0, len(buf) - _QUESTION_LINK_OVERLAP)
+        for match in _QUESTION_LINK_RE.finditer(buf):
+            if match.end() == len(buf):
+                keep = min(keep, match.start())
+                break
+            yield match.group()
+            keep = max(keep, match.end())
+        buf = buf[keep:]
+    yield from _QUESTION_LINK_RE.findall(buf)
 
 
 def command_line_runner() -> None:
@@ -196,13 +306,15 @@ def command_line_runner() -> None:
     try:
         result = answer(qstring, args["num_answers"])
     except ConnectionError as e:
-        logging.exception(e)
+        logger.exception(e)
         print(f"{CONNECTION_ERROR_MESSAGE} {e}")
     except CodeAnswerError as e:
-        logging.exception(e)
+        logger.exception(e)
         print(f"{TECHNICAL_DIFFICULTY_MESSAGE} {e}")
     else:
         _print_answers(result)
+    finally:
+        close()
 
 
 def _get_parser() -> argparse.ArgumentParser:
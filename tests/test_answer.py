@@ -1,8 +1,9 @@
 import gzip
-from functools import partial
+import threading
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import List
-from unittest.mock import Mock, PropertyMock, patch
+from typing import Iterator, List
+from unittest.mock import MagicMock, Mock, patch
 
 import pytest
 import yaml
@@ -10,32 +11,39 @@ import yaml
 from code_answer import answer
 
 _yaml_dir = Path(__file__).parent / "data"
+# str.translate table deleting the non alnum latin-1 chars
+_NON_ALNUM_TABLE = {i: None for i in range(256) if not chr(i).isalnum()}
+# libyaml based loader when PyYAML is built with it
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 
 def _from_yaml(filepath: Path):
     with filepath.open("rt") as f:
-        result = yaml.safe_load(f.read())
+        result = yaml.load(f.read(), Loader=_YamlLoader)
     return result
 
 
 @pytest.fixture
-def monkeypatch_get_url_content(data_dir, monkeypatch):
-    """patch function _get_url_content to get the response
+def monkeypatch_get_url_stream(data_dir, monkeypatch):
+    """patch function _get_url_stream to get the response
     from the local file instead of online"""
-    patched_get_url_content = partial(_get_cached_url_content, data_dir=data_dir)
-    monkeypatch.setattr(answer, "_get_url_content", patched_get_url_content)
+    patched_get_url_stream = partial(_get_cached_url_stream, data_dir=data_dir)
+    monkeypatch.setattr(answer, "_get_url_stream", patched_get_url_stream)
 
 
+@lru_cache(maxsize=1)
 def data_answers() -> dict:
     """test data for test_answer"""
     return _from_yaml(Path(_yaml_dir / "queries.yaml"))
 
 
+@lru_cache(maxsize=1)
 def data_extract_answers() -> dict:
     """test data for test_extract_answer"""
     return _from_yaml(Path(_yaml_dir / "extract_answer.yaml"))
 
 
+@lru_cache(maxsize=1)
 def data_question_links() -> dict:
     """test data for test_question_links"""
     return _from_yaml(Path(_yaml_dir / "question_links.yaml"))
@@ -44,10 +52,18 @@ def data_question_links() -> dict:
 def _format_url_to_filename(url: str, ext: str = ".html") -> str:
     """Return the alnum char of url as filename, extention with ext.
     The result string (exclude ext) is <= 240"""
-    filename = "".join(c for c in url.lower() if c.isalnum())
+    filename = url.lower().translate(_NON_ALNUM_TABLE)
     return f"{filename[:240]}{ext}"
 
 
+def _iter_chunks(text: str, size: int) -> Iterator[str]:
+    """Yield the text in slices of size"""
+    for start in range(0, len(text), size):
+        end = start + size
+        yield text[start:end]
+
+
+@lru_cache(maxsize=64)
 def _get_cached_url_content(url: str, data_dir: Path):
     """Given url, format the url to filename, then read the content from file"""
     filename = _format_url_to_filename(url, ".html.gz")
@@ -56,40 +72,127 @@ def _get_cached_url_content(url: str, data_dir: Path):
         return f.read()
 
 
-def test_get_url_content():
-    url, text = "https://www.google.com/search", "text"
-    mock_resp = Mock()
-    # Because of the way mock attributes are stored you can’t directly attach a
-    # PropertyMock to a mock object.
-    # Instead you can attach it to the mock type object:
-    mock_text_property = PropertyMock(return_value=text)
-    type(mock_resp).text = mock_text_property
-    with patch("requests.get") as patcher:
+def _get_cached_url_stream(url: str, data_dir: Path):
+    """Same as _get_cached_url_content, yield the content as one chunk"""
+    yield _get_cached_url_content(url, data_dir)
+
+
+def test_get_url_stream():
+    url, chunks = "https://stackoverflow.com/questions", ["te", "xt"]
+    mock_resp = MagicMock(encoding="utf-8")
+    mock_resp.__enter__.return_value = mock_resp
+    mock_resp.iter_content.return_value = iter(chunks)
+    with patch.object(answer._SESSION, "get") as patcher:
         patcher.return_value = mock_resp
-        result = answer._get_url_content(url)
-        patcher.assert_called_once_with(url)
+        result = list(answer._get_url_stream(url))
+        patcher.assert_called_once_with(
+            url, timeout=answer.REQUEST_TIMEOUT, stream=True
+        )
         mock_resp.raise_for_status.assert_called_once()
-        assert result == text
+        mock_resp.__exit__.assert_called_once()
+        assert result == chunks
+
+
+@pytest.mark.parametrize(
+    "url,expected",
+    [
+        ("https://a.com/q/1/t", "https://a.com/q/1/t?answertab=scoredesc"),
+        ("https://a.com/q/1/t?x=1", "https://a.com/q/1/t?x=1&answertab=scoredesc"),
+        ("https://a.com/q/1/t#a", "https://a.com/q/1/t?answertab=scoredesc#a"),
+    ],
+)
+def test_get_stackoverflow_scoredesc_url(url, expected):
+    assert answer._get_stackoverflow_scoredesc_url(url) == expected
 
 
 @pytest.mark.parametrize("id,data", argvalues=data_extract_answers().items())
 def test_extract_answer(id, data):
-    result = answer._extract_answer(data["text"])
+    result = answer._extract_answer_from_chunks([data["text"]])
+    if result:
+        result = result.strip()
+    assert result == data["expected"]
+
+
+@pytest.mark.parametrize("id,data", argvalues=data_extract_answers().items())
+def test_extract_answer_from_chunks(id, data):
+    """the answer should not depend on how the page content is chunked"""
+    result = answer._extract_answer_from_chunks(iter(data["text"]))
     if result:
         result = result.strip()
     assert result == data["expected"]
 
 
 @pytest.mark.parametrize("id,data", data_question_links().items())
-def test_get_question_links(id, data, monkeypatch_get_url_content):
+def test_get_question_links(id, data, monkeypatch_get_url_stream):
     got = answer.get_question_links(data["query"])
     assert got == data["question_links"]
 
 
+@pytest.mark.parametrize("chunk_size", [1, 7, 100, 16384])
+@pytest.mark.parametrize("id,data", data_question_links().items())
+def test_extract_question_links_from_chunks(id, data, chunk_size, data_dir):
+    """the links should not depend on how the page content is chunked"""
+    text = _get_cached_url_content(answer.urlencode_search_url(data["query"]), data_dir)
+    got = answer._extract_question_links(_iter_chunks(text, chunk_size))
+    assert got == data["question_links"]
+
+
+def test_extract_question_links_dedup_and_limit():
+    links = [
+        f"https://stackoverflow.com/questions/{i}/q"
+        for i in range(answer.QUESTION_LINKS_LIMIT + 5)
+    ]
+    text = " ".join(link for link in links for _ in range(3))
+    got = answer._extract_question_links(_iter_chunks(text, 10))
+    assert got == links[: answer.QUESTION_LINKS_LIMIT]
+
+
+def _patch_reverse_order_get_answer(monkeypatch, links: List[str], results: dict):
+    """patch get_question_links to return links, and get_answer to finish the
+    links in reverse order, each returning or raising its item in results"""
+    done = {link: threading.Event() for link in links}
+
+    def get_answer(link):
+        index = links.index(link)
+        if index + 1 < len(links):
+            assert done[links[index + 1]].wait(timeout=5)
+        done[link].set()
+        if isinstance(result := results[link], Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(answer, "get_question_links", lambda query: links)
+    monkeypatch.setattr(answer, "get_answer", get_answer)
+
+
+def test_answer_keeps_link_order(monkeypatch):
+    links = ["link0", "link1", "link2", "link3"]
+    results = {"link0": "r0", "link1": "r1", "link2": None, "link3": "r3"}
+    _patch_reverse_order_get_answer(monkeypatch, links, results)
+    got = answer.answer("any", len(links))
+    assert got == [
+        answer.Answer(link, results[link]) for link in ("link0", "link1", "link3")
+    ]
+
+
+def test_answer_raises_first_error_in_link_order(monkeypatch):
+    links = ["link0", "link1", "link2", "link3"]
+    results = {
+        "link0": "r0",
+        "link1": answer.GetAnswerError("link1"),
+        "link2": "r2",
+        "link3": answer.ConnectionError("link3"),
+    }
+    _patch_reverse_order_get_answer(monkeypatch, links, results)
+    with pytest.raises(answer.GetAnswerError) as e:
+        answer.answer("any", len(links))
+    assert "link1" in str(e.value)
+
+
 def test_answer_should_throw_connection_error(monkeypatch):
     query = "any"
     resp = Mock(side_effect=answer.ConnectionError(query))
-    monkeypatch.setattr(answer, "_get_url_content", resp)
+    monkeypatch.setattr(answer, "_get_url_stream", resp)
     with pytest.raises(answer.ConnectionError) as e:
         answer.answer(query)
     assert query in str(e.value)
@@ -98,7 +201,7 @@ def test_answer_should_throw_connection_error(monkeypatch):
 def test_answer_GetQuestionLinksError(monkeypatch):
     url, query = "any_url", "any"
     resp = Mock(side_effect=answer.RequestException(url, query))
-    monkeypatch.setattr(answer, "_get_url_content", resp)
+    monkeypatch.setattr(answer, "_get_url_stream", resp)
     with pytest.raises(answer.GetQuestionLinksError) as e:
         answer.answer(query)
     assert url, query in str(e.value)
@@ -107,14 +210,14 @@ def test_answer_GetQuestionLinksError(monkeypatch):
 def test_answer_GetAnswerError(monkeypatch):
     url, query = "any_url", "any"
     resp = Mock(side_effect=answer.RequestException(url, query))
-    monkeypatch.setattr(answer, "_get_url_content", resp)
+    monkeypatch.setattr(answer, "_get_url_stream", resp)
     with pytest.raises(answer.GetAnswerError) as e:
         answer.get_answer(query)
     assert url, query in str(e.value)
 
 
 @pytest.mark.parametrize("id,query", data_answers().items())
-def test_answer(id, query, monkeypatch_get_url_content):
+def test_answer(id, query, monkeypatch_get_url_stream):
     got = answer.answer(query["query"], query["num_answer"])
     _validate_answers(got, query["answers"])
 